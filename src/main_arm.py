@@ -2,14 +2,54 @@
 SparkBox Arm版本 - 适用于开发板部署
 集成 GPIO 按键控制、摄像头采集和 Web 服务
 """
+import os
 import sys
+import json
 import time
 import yaml
+import queue
 import shutil
 import atexit
+import tempfile
 import threading
+from functools import lru_cache
 from pathlib import Path
 
+import cv2
+import numpy as np
+
+# 优先使用C加速的YAML加载器（纯Python版慢5-10倍）
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+
+@lru_cache(maxsize=8)
+def _load_config_cached(path_str):
+    """按路径缓存的配置加载，同一文件只解析一次
+
+    另备 .cache.json 侧文件：json.loads 远快于YAML解析，
+    源文件未变时后续启动直接走JSON，板子上冷启动明显更快
+    """
+    src = Path(path_str)
+    cache = src.with_suffix('.cache.json')
+    try:
+        if cache.exists() and cache.stat().st_mtime >= src.stat().st_mtime:
+            return json.loads(cache.read_text(encoding='utf-8'))
+    except Exception:
+        pass  # 缓存损坏则走正常YAML解析
+
+    with open(path_str, 'r', encoding='utf-8') as f:
+        config = yaml.load(f, Loader=_YamlLoader)
+
+    # 尽力写缓存，失败（只读分区等）不影响正常启动
+    try:
+        cache.write_text(json.dumps(config, ensure_ascii=False), encoding='utf-8')
+    except Exception:
+        pass
+    return config
+
 # Try to import GPIO, if failed, maybe verify environment
 try:
     import Hobot.GPIO as GPIO
@@ -26,19 +66,9 @@ sys.path.append(str(TASKS_DIR / "talk"))
 sys.path.append(str(TASKS_DIR / "ui_output"))
 
 # --- Imports from project modules ---
-try:
-    from detect import SquareDetector
-    from voice2text import Voice2Text
-    from vision_module import VisionAgent
-    from mentor_module import SolutionAgent
-    from image_module import ImageGenAgent
-    from camera_manager import CameraManager
-    from ai_manager import AIManager
-    from web_manager import WebManager
-    from io_input import GPIOButton, load_gpio_config
-except ImportError as e:
-    print(f"Error importing modules: {e}")
-    sys.exit(1)
+# 重量级模块延迟到各 _init_* 方法中导入，缩短冷启动时间
+# 导入失败统一收集，在 run() 开始时集中报告
+_IMPORT_ERRORS = []
 
 class SparkBoxApp:
     def __init__(self):
@@ -46,7 +76,13 @@ class SparkBoxApp:
         
         # Paths
         self.logs_dir = BASE_DIR / "logs"
-        self.temp_dir = self.logs_dir / "temp"
+        # 临时快照优先放tmpfs：不写SD卡，快照热路径免去闪存I/O且减少磨损
+        shm = Path('/dev/shm')
+        if shm.exists() and os.access(shm, os.W_OK):
+            self.temp_dir = Path(tempfile.mkdtemp(prefix='sparkbox_', dir=str(shm)))
+            print(f"Using tmpfs temp dir: {self.temp_dir}")
+        else:
+            self.temp_dir = self.logs_dir / "temp"
         self.asset_dir = BASE_DIR / "asset"
         self.config_dir = BASE_DIR / "config"
         
@@ -71,42 +107,164 @@ class SparkBoxApp:
 
     def _load_config(self, path):
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+            return _load_config_cached(str(path))
         except Exception as e:
             print(f"Failed to load config {path}: {e}")
             return {}
 
     def _init_detector(self):
+        try:
+            from detect import SquareDetector
+        except ImportError as e:
+            print(f"Error importing detect: {e}")
+            _IMPORT_ERRORS.append(f"detect: {e}")
+            self.detector = None
+            return
+
         camera_config = self.asset_dir / "camera.yaml"
         if not camera_config.exists():
             print(f"Warning: Camera config not found at {camera_config}")
         self.detector = SquareDetector(str(camera_config))
 
+        # 场景变化门控状态：画面静止时复用上一次检测结果
+        self._prev_small = None
+        self._last_detection = None
+        self._motion_threshold = 2.5
+        # 无人观看时的低频检测节拍
+        self._last_idle_detect = 0.0
+
+    def _detect_with_motion_gate(self, frame):
+        """画面几乎无变化时跳过完整检测，直接复用上一次结果"""
+        small = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (64, 36))
+
+        if (self._prev_small is not None and self._last_detection is not None
+                and np.mean(cv2.absdiff(small, self._prev_small)) < self._motion_threshold):
+            self._prev_small = small
+            # 拷贝一份，后续叠加层不会污染缓存帧
+            return self._last_detection.copy()
+
+        # 取景反馈用半分辨率检测（快照时由save_snapshot做全分辨率检测）
+        detected_frame = self.detector.detect_preview(frame)
+        self._prev_small = small
+        self._last_detection = detected_frame.copy()
+        return detected_frame
+
+    def _detect_gated(self, frame, ai_busy):
+        """按需跑检测：AI处理期间复用旧标注，无人观看时降到约2fps"""
+        # AI处理中UI被锁定，检测结果没人消费
+        if ai_busy and self._last_detection is not None:
+            return self._last_detection.copy()
+
+        # 没有网页观众时低频检测，保持快照可用即可
+        viewers = self.web_manager.active_viewers if self.web_manager else 0
+        if viewers == 0 and self._last_detection is not None:
+            now = time.monotonic()
+            if now - self._last_idle_detect < 0.5:
+                return self._last_detection.copy()
+            self._last_idle_detect = now
+
+        return self._detect_with_motion_gate(frame)
+
+    def _capture_loop(self):
+        """采集线程：独立读帧，单槽队列只保留最新一帧（丢旧不丢新）"""
+        while self.running:
+            ret, frame = self.camera_manager.get_frame()
+            if not ret:
+                print("Failed to grab frame.")
+                self.running = False
+                break
+            try:
+                self._frame_q.get_nowait()
+            except queue.Empty:
+                pass
+            self._frame_q.put(frame)
+
     def _init_voice(self):
         voice_config = self.config_dir / "voice2text.yaml"
         try:
+            from voice2text import Voice2Text
             self.voice = Voice2Text(str(voice_config))
         except Exception as e:
             print(f"Voice module init failed: {e}")
             self.voice = None
 
     def _init_agents(self):
+        """代理初始化放后台线程：摄像头先出画面，AI模块随后就绪"""
+        self.vision_agent = None
+        self.solution_agent = None
+        self.image_agent = None
+        self.combined_agent = None
+        threading.Thread(target=self._init_agents_worker, daemon=True).start()
+
+    def _init_agents_worker(self):
+        try:
+            from vision_module import VisionAgent
+            from mentor_module import SolutionAgent
+            from image_module import ImageGenAgent
+            from vision_solution_module import VisionSolutionAgent
+        except ImportError as e:
+            print(f"Error importing agents: {e}")
+            _IMPORT_ERRORS.append(f"agents: {e}")
+            return
+
         if not self.global_config:
             print("Error: Global config missing. AI agents disabled.")
-            self.vision_agent = None
-            self.solution_agent = None
-            self.image_agent = None
             return
 
         self.vision_agent = VisionAgent(self.global_config)
         self.solution_agent = SolutionAgent(self.global_config)
         self.image_agent = ImageGenAgent(self.global_config)
-    
+
+        # 视觉+方案合并代理：一次调用省一个远程往返，失败时流程自动回退两段式
+        try:
+            self.combined_agent = VisionSolutionAgent(self.global_config)
+        except Exception as e:
+            print(f"Combined agent init failed: {e}")
+            self.combined_agent = None
+
+        # ai_manager 在主线程稍后创建，就绪后把代理注入进去
+        for _ in range(100):
+            if hasattr(self, 'ai_manager'):
+                break
+            time.sleep(0.1)
+        if hasattr(self, 'ai_manager'):
+            self.ai_manager.vision_agent = self.vision_agent
+            self.ai_manager.solution_agent = self.solution_agent
+            self.ai_manager.image_agent = self.image_agent
+            self.ai_manager.combined_agent = self.combined_agent
+        print("AI agents ready.")
+
+        # 预热TLS连接，首次拍照不再付冷启动代价
+        self._warmup_agents()
+
+    def _warmup_agents(self):
+        """轻量预热各代理的HTTP连接（仅握手，不产生推理费用），异常一律吞掉"""
+        for agent in (self.vision_agent, self.solution_agent):
+            if agent is None:
+                continue
+            try:
+                agent.client.models.list()
+            except Exception:
+                pass
+
     def _init_managers(self):
         """初始化各个管理器"""
-        # 初始化摄像头管理器
-        self.camera_manager = CameraManager(camera_id=0, width=1280, height=720)
+        try:
+            from camera_manager import CameraManager
+            from ai_manager import AIManager
+            from web_manager import WebManager
+        except ImportError as e:
+            print(f"Error importing managers: {e}")
+            _IMPORT_ERRORS.append(f"managers: {e}")
+            return
+
+        # 初始化摄像头管理器（分辨率可配置，检测器不需要720p）
+        camera_cfg = (self.global_config or {}).get("camera", {})
+        self.camera_manager = CameraManager(
+            camera_id=0,
+            width=camera_cfg.get("width", 960),
+            height=camera_cfg.get("height", 540)
+        )
         
         # 初始化AI管理器
         self.ai_manager = AIManager(
@@ -114,7 +272,8 @@ class SparkBoxApp:
             self.vision_agent,
             self.solution_agent,
             self.image_agent,
-            self.voice
+            self.voice,
+            combined_agent=self.combined_agent
         )
         
         # 初始化Web管理器
@@ -152,13 +311,23 @@ class SparkBoxApp:
         # 防止 Reset 后误触 Snapshot
         self.last_reset_time = 0
         self.reset_refractory_period = 2.0 # Reset 后2秒内不接受拍照
+
+        # 边沿回调在中断线程执行，共享状态要加锁
+        self._gpio_lock = threading.Lock()
         
         if GPIO is None:
             return
 
+        try:
+            from io_input import GPIOButton, load_gpio_config
+        except ImportError as e:
+            print(f"Error importing io_input: {e}")
+            _IMPORT_ERRORS.append(f"io_input: {e}")
+            return
+
         io_config_path = self.config_dir / "io.yaml"
         print(f"Loading GPIO config from {io_config_path}")
-        
+
         try:
             self.gpio_config = load_gpio_config(str(io_config_path))
             if not self.gpio_config:
@@ -172,7 +341,9 @@ class SparkBoxApp:
                     # mode = config.get('mode', 'single')
                     # 初始化 GPIOButton (假设开发板按键是低电平触发 active_low=True)
                     try:
-                        self.gpio_buttons[name] = GPIOButton(pin, active_low=True, bouncetime=100)
+                        # capture/PGUP/PGDN 走边沿中断回调；video 要判电平(PTT)仍留在轮询
+                        cb = (lambda n=name: self._on_gpio_edge(n)) if name != 'video' else None
+                        self.gpio_buttons[name] = GPIOButton(pin, active_low=True, bouncetime=100, press_callback=cb)
                         print(f"  Initialized {name} on Pin {pin}")
                     except Exception as e:
                         print(f"  Failed to init {name}: {e}")
@@ -183,11 +354,12 @@ class SparkBoxApp:
 
     def cleanup(self):
         "Clean up resources on exit."
-        # Clean up temp directory
+        # Clean up temp directory（tmpfs目录退出时直接删掉，不再重建）
         if self.temp_dir.exists():
             try:
                 shutil.rmtree(self.temp_dir)
-                self.temp_dir.mkdir(parents=True, exist_ok=True)
+                if not str(self.temp_dir).startswith('/dev/shm'):
+                    self.temp_dir.mkdir(parents=True, exist_ok=True)
             except Exception:
                 pass
         
@@ -204,57 +376,64 @@ class SparkBoxApp:
         if self.voice:
             self.voice.close()
 
-    def handle_gpio(self):
-        """处理 GPIO 输入循环 - 根据当前状态动态调整按键行为"""
-        if not self.gpio_buttons:
+    def _on_gpio_edge(self, name):
+        """边沿中断回调 - capture/PGUP/PGDN 在中断线程直接处理，不占主循环"""
+        if name == 'PGUP':
+            print("[GPIO] PGUP -> Prev Slide/Page")
+            self.web_manager.push_event("control", "Previous", {"action": "prev"})
+            return
+
+        if name == 'PGDN':
+            print("[GPIO] PGDN -> Next Slide/Page")
+            self.web_manager.push_event("control", "Next", {"action": "next"})
+            return
+
+        if name != 'capture':
             return
 
-        # 获取当前应用的状态 (idle, processing, done, error 等)
-        # 我们假设 ai_manager 中有一个状态可以查询，或者我们通过 self.ai_manager.is_busy() 简单判断
-        # 更精细的控制可以增加一个 self.app_state 变量
-        current_ai_status = self.ai_manager.get_status() # {"status_message": "...", "is_processing": True/False, "step": "..."}
-        is_processing = current_ai_status.get("is_processing", False)
-        
         # -------------------
-        # 1. Capture 键 (Pin 16)
+        # Capture 键 (Pin 16)
         # -------------------
-        # 逻辑修改：
+        # 逻辑：
         # - 如果系统空闲 (Idle) -> Capture = 拍照
         # - 如果系统已有结果 (Result) -> Capture = 重置 (下一题)
         # - 不再依赖长短按区分
-        if 'capture' in self.gpio_buttons:
-            btn = self.gpio_buttons['capture']
-            
-            # 使用 get_press() 获取一次性的按下事件，不关心时长
-            if btn.get_press():
-                now = time.time()
-                # 防抖冷却检查
-                if now - self.last_capture_time < self.capture_cooldown:
-                    print(f"  -> Capture Ignored (Cooldown: {now - self.last_capture_time:.2f}s)")
-                else:
-                    self.last_capture_time = now
-                    print("[GPIO] Capture Button Triggered")
-                    
-                    # 如果正在处理中，忽略按键
-                    if is_processing:
-                         print("  -> System Busy, Ignored.")
-                    
-                    # 如果当前没有结果（空闲状态），则执行【拍照】
-                    elif not self.ai_manager.has_result: 
-                        # 检查是否刚重置过 (防止 Reset 按键的释放动作或弹跳误触发拍照)
-                        if now - self.last_reset_time < self.reset_refractory_period:
-                            print(f"  -> Reset refractory period active ({now - self.last_reset_time:.2f}s < {self.reset_refractory_period}s). Snapshot ignored.")
-                        else:
-                            print("  -> Context: Idle -> Action: Snapshot")
-                            self.trigger_snapshot()
-                        
-                    # 如果当前已有结果，则执行【重置/下一题】
-                    else:
-                        print("  -> Context: Result Shown -> Action: Reset")
-                        self.handle_reset()
+        with self._gpio_lock:
+            now = time.time()
+            # 防抖冷却检查
+            if now - self.last_capture_time < self.capture_cooldown:
+                print(f"  -> Capture Ignored (Cooldown: {now - self.last_capture_time:.2f}s)")
+                return
+            self.last_capture_time = now
+
+        print("[GPIO] Capture Button Triggered")
+        is_processing = self.ai_manager.get_status().get("is_processing", False)
+
+        # 如果正在处理中，忽略按键
+        if is_processing:
+            print("  -> System Busy, Ignored.")
+
+        # 如果当前没有结果（空闲状态），则执行【拍照】
+        elif not self.ai_manager.has_result:
+            # 检查是否刚重置过 (防止 Reset 按键的释放动作或弹跳误触发拍照)
+            if now - self.last_reset_time < self.reset_refractory_period:
+                print(f"  -> Reset refractory period active ({now - self.last_reset_time:.2f}s < {self.reset_refractory_period}s). Snapshot ignored.")
+            else:
+                print("  -> Context: Idle -> Action: Snapshot")
+                self.trigger_snapshot()
+
+        # 如果当前已有结果，则执行【重置/下一题】
+        else:
+            print("  -> Context: Result Shown -> Action: Reset")
+            self.handle_reset()
+
+    def handle_gpio(self):
+        """处理 GPIO 输入循环 - 仅剩需要电平判断的 Video 键 (PTT)"""
+        if not self.gpio_buttons:
+            return
 
         # -------------------
-        # 2. Video 键 (Pin 18)
+        # Video 键 (Pin 18)
         # -------------------
         # 逻辑：在结果页按一下进入语音模式，在语音模式按住说话
         if 'video' in self.gpio_buttons:
@@ -293,22 +472,6 @@ class SparkBoxApp:
                             # 启动异步线程处理录音结果
                             threading.Thread(target=self.process_voice_after_record).start()
 
-        # -------------------
-        # 3. PGUP (Pin 22) -> 前翻
-        # -------------------
-        if 'PGUP' in self.gpio_buttons:
-            if self.gpio_buttons['PGUP'].get_press():
-                print("[GPIO] PGUP -> Prev Slide/Page")
-                self.web_manager.push_event("control", "Previous", {"action": "prev"})
-
-        # -------------------
-        # 4. PGDN (Pin 36) -> 后翻
-        # -------------------
-        if 'PGDN' in self.gpio_buttons:
-            if self.gpio_buttons['PGDN'].get_press():
-                print("[GPIO] PGDN -> Next Slide/Page")
-                self.web_manager.push_event("control", "Next", {"action": "next"})
-
     def trigger_snapshot(self):
         """触发拍照流程"""
         if self.ai_manager.is_busy():
@@ -367,7 +530,15 @@ class SparkBoxApp:
 
     def run(self):
         "Main application loop"
-        
+
+        # 集中报告初始化阶段的导入失败
+        if _IMPORT_ERRORS:
+            print("Error: The following modules failed to import:")
+            for err in _IMPORT_ERRORS:
+                print(f"  - {err}")
+            print("Please ensure your project structure is correct.")
+            return
+
         # 初始化摄像头
         try:
             self.camera_manager.initialize_camera()
@@ -386,39 +557,41 @@ class SparkBoxApp:
         
         # Start Flask server (Auto open browser in Kiosk mode)
         self.web_manager.start_server_async(debug=False, auto_open_browser=True)
-        
+
+        # 采集线程：摄像头读帧与检测/渲染重叠，主循环不再被 cap.read() 卡住
+        self._frame_q = queue.Queue(maxsize=1)
+        threading.Thread(target=self._capture_loop, daemon=True).start()
+
         try:
             while self.running:
-                # 1. Camera Frame
-                ret, frame = self.camera_manager.get_frame()
-                if not ret:
-                    print("Failed to grab frame.")
-                    break
-                
-                # 2. Detection (Detect square)
-                detected_frame, _ = self.detector.detect_white_square_with_black_border(frame)
-                
-                # 3. Update Status for Managers
+                # 1. Camera Frame（来自采集线程，超时说明暂时没有新帧）
+                try:
+                    frame = self._frame_q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+                # 2. Detection (Detect square) - 带场景变化/观众/AI忙碌门控
                 ai_status = self.ai_manager.get_status()
+                detected_frame = self._detect_gated(frame, ai_status["is_processing"])
+
+                # 3. Update Status for Managers
                 self.camera_manager.update_status(
                     ai_status["status_message"],
                     ai_status["is_processing"],
                     self.voice.is_recording if self.voice else False
                 )
                 
-                # 4. Handle Voice Stream Buffering if detecting
-                if self.voice and self.voice.is_recording:
-                    self.voice.read_audio_chunk()
-                
-                # 5. Process Frame for Web View
+                # 录音由 Voice2Text 的后台线程自行采集，主循环无需逐帧读取音频
+
+                # 4. Process Frame for Web View
                 detected_frame = self.camera_manager.add_status_overlay(detected_frame)
                 self.camera_manager.update_processed_frame(detected_frame)
-                
-                # 6. GPIO Event Handling
+
+                # 5. GPIO Event Handling
                 self.handle_gpio()
-                
-                # Loop Delay
-                time.sleep(0.01)
+
+                # 无需定时休眠：循环由阻塞的帧队列按相机帧率驱动，
+                # 按键走边沿中断，空闲时线程挂在 get(timeout) 上不耗CPU
         
         except KeyboardInterrupt:
             print("\nInterrupted by user.")
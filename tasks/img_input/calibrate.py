@@ -4,6 +4,12 @@ import os
 import yaml
 from datetime import datetime
 
+# libyaml C后端序列化，缺省回退纯Python实现
+try:
+    from yaml import CSafeDumper as _YamlDumper
+except ImportError:
+    from yaml import SafeDumper as _YamlDumper
+
 # 棋盘格参数：11列8行，每个小格30mm
 CHECKERBOARD = (11, 8)
 SQUARE_SIZE = 30  # mm
@@ -13,10 +19,34 @@ criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
 objp = np.zeros((1, CHECKERBOARD[0] * CHECKERBOARD[1], 3), np.float32)
 objp[0, :, :2] = np.mgrid[0:CHECKERBOARD[0], 0:CHECKERBOARD[1]].T.reshape(-1, 2) * SQUARE_SIZE
 
-# 用于存储所有棋盘格的object points和image points
-objpoints = []  # 3D实际世界坐标
+# 用于存储所有棋盘格的image points
+# （世界坐标每张图都相同，标定时直接按捕获数复制objp，不逐张append）
 imgpoints = []  # 2D图像坐标
 
+# 文字精灵缓存：状态文字只在保存数/检测结果变化时变，不必每帧重新栅格化
+_text_sprites = {}
+
+
+def _blit_text(frame, text, x, y, scale, color, thickness):
+    """把缓存的文字精灵按前景掩码贴到帧上（y为putText基线坐标）"""
+    key = (text, color, scale, thickness)
+    sprite = _text_sprites.get(key)
+    if sprite is None:
+        if len(_text_sprites) > 64:
+            _text_sprites.clear()
+        (w, h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+        canvas = np.zeros((h + baseline, max(w, 1), 3), np.uint8)
+        cv2.putText(canvas, text, (0, h), cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+        sprite = (canvas, canvas.any(axis=2), h)
+        _text_sprites[key] = sprite
+    canvas, mask, th = sprite
+    y = y - th
+    h, w = canvas.shape[:2]
+    if x < 0 or y < 0 or y + h > frame.shape[0] or x + w > frame.shape[1]:
+        return
+    roi = frame[y:y + h, x:x + w]
+    roi[mask] = canvas[mask]
+
 # 设置标定数据保存路径
 asset_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'asset')
 os.makedirs(asset_dir, exist_ok=True)
@@ -44,25 +74,31 @@ while True:
         break
     
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    
-    # 检测棋盘格角点
-    ret_detect, corners = cv2.findChessboardCorners(gray, CHECKERBOARD, None)
-    
-    # 在图像上绘制检测结果
+
+    # 半分辨率检测棋盘格角点：像素量1/4，SB检测器自带亚像素精度
+    small = cv2.pyrDown(gray)
+    # flags必须用关键字传：第三个位置参数是corners输出种子，
+    # 位置传int会被吞掉且不报错，实际按flags=0运行
+    ret_detect, corners = cv2.findChessboardCornersSB(
+        small, CHECKERBOARD,
+        flags=cv2.CALIB_CB_EXHAUSTIVE | cv2.CALIB_CB_ACCURACY)
+
+    # 在图像上绘制检测结果（取景反馈用粗角点即可，
+    # 亚像素精细化只在按'c'捕获时做，预览帧不白算Levenberg迭代）
     if ret_detect:
-        # 亚像素精细化
-        corners_refined = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
-        cv2.drawChessboardCorners(frame, CHECKERBOARD, corners_refined, ret_detect)
+        # 角点放大回全分辨率
+        corners = corners * 2.0
+        cv2.drawChessboardCorners(frame, CHECKERBOARD, corners, ret_detect)
         status_text = f"Detected | Saved: {saved_count}/15+ | Press 'c'"
         text_color = (0, 255, 0)
     else:
         status_text = f"Not detected | Saved: {saved_count}/15+ | Adjust"
         text_color = (0, 0, 255)
     
-    # 显示状态信息
-    cv2.putText(frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, text_color, 2)
-    cv2.putText(frame, "Press 'c' to capture, 'q' to calibrate, 's' to save debug, 'q' to quit", 
-                (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    # 显示状态信息（精灵缓存，避免每帧FreeType栅格化）
+    _blit_text(frame, status_text, 10, 30, 0.7, text_color, 2)
+    _blit_text(frame, "Press 'c' to capture, 'q' to calibrate, 's' to save debug, 'q' to quit",
+               10, 70, 0.5, (255, 255, 255), 1)
     
     cv2.imshow('Calibration', frame)
     
@@ -71,7 +107,8 @@ while True:
     
     if key == ord('c'):  # 捕获
         if ret_detect:
-            objpoints.append(objp)
+            # 捕获时才做小窗口亚像素精细化
+            corners_refined = cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
             imgpoints.append(corners_refined)
             saved_count += 1
             print(f"Captured {saved_count} images")
@@ -108,7 +145,8 @@ if saved_count >= 3:
             img_size = (1280, 720)
         cap.release()
     
-    # 执行标定
+    # 执行标定（每张图的世界坐标一致，按捕获数展开同一个objp）
+    objpoints = [objp] * saved_count
     ret, camera_matrix, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(
         objpoints, imgpoints, img_size, None, None
     )
@@ -116,16 +154,17 @@ if saved_count >= 3:
     if ret:
         print(f"Calibration successful! Reprojection error: {ret:.4f}")
         
-        # 计算标定精度
-        total_error = 0
-        total_points = 0
-        for i in range(len(objpoints)):
-            imgpoints2, _ = cv2.projectPoints(objpoints[i], rvecs[i], tvecs[i], camera_matrix, dist_coeffs)
-            error = cv2.norm(imgpoints[i], imgpoints2, cv2.NORM_L2) / len(imgpoints2)
-            total_error += error
-            total_points += len(imgpoints2)
-        
-        mean_error = total_error / len(objpoints)
+        # 计算标定精度：逐图投影后一次性用numpy归约，替代逐图cv2.norm调用
+        projected = [
+            cv2.projectPoints(objpoints[i], rvecs[i], tvecs[i], camera_matrix, dist_coeffs)[0]
+            for i in range(len(objpoints))
+        ]
+        a = np.stack(imgpoints).reshape(len(imgpoints), -1, 2)
+        b = np.stack(projected).reshape(len(projected), -1, 2)
+        diff = a - b
+        # 与原 cv2.NORM_L2/P 口径一致：每图Frobenius范数除以点数
+        per_image_error = np.sqrt((diff * diff).sum(axis=(1, 2))) / a.shape[1]
+        mean_error = float(per_image_error.mean())
         print(f"Mean reprojection error: {mean_error:.4f} pixels")
         
         # 保存标定结果到YAML文件
@@ -142,9 +181,16 @@ if saved_count >= 3:
         }
         
         with open(calibration_file, 'w', encoding='utf-8') as f:
-            yaml.dump(calibration_data, f, default_flow_style=False, allow_unicode=True)
-        
+            yaml.dump(calibration_data, f, Dumper=_YamlDumper,
+                      default_flow_style=False, allow_unicode=True)
+
+        # 同时保存NPZ二进制格式：检测器启动时直接np.load，免去YAML解析
+        npz_file = os.path.join(asset_dir, 'camera.npz')
+        np.savez(npz_file, K=camera_matrix, D=dist_coeffs.flatten(),
+                 size=np.array(img_size))
+
         print(f"\nCalibration results saved to: {calibration_file}")
+        print(f"Binary copy saved to: {npz_file}")
         print(f"\nCamera matrix:")
         print(camera_matrix)
         print(f"\nDistortion coefficients:")
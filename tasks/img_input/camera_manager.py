@@ -2,11 +2,25 @@
 摄像头管理器 - 负责摄像头处理、图像采集和快照功能
 """
 import cv2
+import numpy as np
+import os
 import time
+import queue
 import threading
 from datetime import datetime
 from pathlib import Path
 
+# OpenCV全局调优：关掉T-API，避免小核函数走OpenCL调度的首帧卡顿和
+# 每次调用的队列提交开销（X3上也没有可用的OpenCL设备）；
+# 线程数默认留一个核给采集/Web/AI线程，可用 SPARKBOX_CV_THREADS 覆盖
+cv2.setUseOptimized(True)
+try:
+    cv2.ocl.setUseOpenCL(False)
+except Exception:
+    pass
+cv2.setNumThreads(int(os.environ.get(
+    'SPARKBOX_CV_THREADS', max(1, (os.cpu_count() or 2) - 1))))
+
 
 class CameraManager:
     def __init__(self, camera_id=0, width=1280, height=720):
@@ -27,21 +41,59 @@ class CameraManager:
         # Frame state
         self.latest_frame = None
         self.latest_raw_frame = None
+        self.frame_seq = 0  # 处理帧版本号，供Web端判断是否需要重新编码
         self.frame_lock = threading.Lock()
+        # 新帧到达通知：流端等在条件变量上，不再定时轮询
+        self.frame_cond = threading.Condition(self.frame_lock)
         
         # Status overlay settings
         self.status_message = "Ready"
         self.is_processing = False
         self.is_recording = False
-    
+
+        # 叠加层精灵缓存：文字/REC标记只栅格化一次，之后逐帧用NumPy切片贴图
+        self._overlay_cache = {}
+
+        # 已确认存在的目录集合，避免每次快照重复mkdir
+        self._made_dirs = set()
+
+        # 异步写盘队列：常驻单线程消费，省去每次快照新建线程的开销
+        self._io_q = queue.Queue()
+        self._io_thread = threading.Thread(target=self._io_worker, daemon=True)
+        self._io_thread.start()
+
+    def _io_worker(self):
+        """写盘工作线程：消费 (temp_path, log_path, jpg_bytes) 任务"""
+        while True:
+            task = self._io_q.get()
+            if task is None:
+                break
+            temp_path, log_path, jpg_bytes = task
+            try:
+                # 同分区优先硬链接（零拷贝），失败再写字节
+                try:
+                    os.link(temp_path, log_path)
+                except OSError:
+                    with open(log_path, 'wb') as f:
+                        f.write(jpg_bytes)
+                print(f"Saved to logs: {log_path}")
+            except Exception as e:
+                print(f"Log copy failed: {e}")
+            finally:
+                self._io_q.task_done()
+
     def initialize_camera(self):
         """初始化摄像头"""
         self.cap = cv2.VideoCapture(self.camera_id)
-        
+
         # Set camera parameters
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
-        
+        # MJPG压缩传输，显著降低USB带宽占用
+        self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        # 驱动侧只留1个缓冲，read()永远拿到最新帧（部分后端不支持，忽略失败）
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
         if not self.cap.isOpened():
             raise RuntimeError("Could not open camera")
         
@@ -52,10 +104,13 @@ class CameraManager:
         if not self.cap or not self.cap.isOpened():
             return None, None
         
+        # cap.read() 每次都返回新分配的数组（不复用缓冲区），
+        # 因此 get_latest_raw_frame 拿到的引用不会被后续帧原地覆盖，
+        # 快照线程可以直接使用而无需复制
         ret, frame = self.cap.read()
         if not ret:
             return None, None
-        
+
         # Store raw frame
         with self.frame_lock:
             self.latest_raw_frame = frame
@@ -69,27 +124,76 @@ class CameraManager:
     
     def update_processed_frame(self, processed_frame):
         """更新处理后的帧"""
-        with self.frame_lock:
+        with self.frame_cond:
             self.latest_frame = processed_frame
+            self.frame_seq += 1
+            self.frame_cond.notify_all()
+
+    def wait_for_new_frame(self, last_seq, timeout=0.5):
+        """阻塞等待比 last_seq 新的帧，返回 (frame, seq)；超时返回 (None, last_seq)"""
+        with self.frame_cond:
+            if self.frame_seq == last_seq:
+                self.frame_cond.wait_for(lambda: self.frame_seq != last_seq, timeout=timeout)
+            if self.frame_seq == last_seq:
+                return None, last_seq
+            return self.latest_frame, self.frame_seq
     
     def get_latest_processed_frame(self):
         """获取最新的处理后帧"""
         with self.frame_lock:
             return self.latest_frame
     
+    def _get_text_sprite(self, text, color, scale=1, thickness=2):
+        """获取（必要时渲染并缓存）文字精灵: (BGR图, 前景掩码)"""
+        key = (text, color, scale, thickness)
+        sprite = self._overlay_cache.get(key)
+        if sprite is None:
+            # 状态字符串种类有限，简单防止缓存无限增长
+            if len(self._overlay_cache) > 64:
+                self._overlay_cache.clear()
+
+            (w, h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+            canvas = np.zeros((h + baseline, max(w, 1), 3), dtype=np.uint8)
+            cv2.putText(canvas, text, (0, h), cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+            # 附带文字高度，便于调用方把基线坐标换算成左上角
+            sprite = (canvas, canvas.any(axis=2), h)
+            self._overlay_cache[key] = sprite
+        return sprite
+
+    def _get_rec_sprite(self):
+        """获取（必要时渲染并缓存）REC录音指示精灵"""
+        sprite = self._overlay_cache.get("__rec__")
+        if sprite is None:
+            canvas = np.zeros((40, 130, 3), dtype=np.uint8)
+            cv2.circle(canvas, (15, 20), 15, (0, 0, 255), -1)
+            cv2.putText(canvas, "REC", (45, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+            sprite = (canvas, canvas.any(axis=2), canvas.shape[0])
+            self._overlay_cache["__rec__"] = sprite
+        return sprite
+
+    @staticmethod
+    def _blit_sprite(frame, sprite, x, y):
+        """把精灵按前景掩码贴到帧上（越界时跳过）"""
+        canvas, mask, _ = sprite
+        h, w = canvas.shape[:2]
+        if x < 0 or y < 0 or y + h > frame.shape[0] or x + w > frame.shape[1]:
+            return
+        roi = frame[y:y + h, x:x + w]
+        roi[mask] = canvas[mask]
+
     def add_status_overlay(self, frame):
         """添加状态叠加层"""
-        # Status overlay
+        # Status overlay（文字精灵缓存，避免每帧重复栅格化字体）
         status_color = (0, 255, 0) if not self.is_processing else (0, 165, 255)
-        cv2.putText(frame, f"Status: {self.status_message}", (20, 40), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, status_color, 2)
-        
+        sprite = self._get_text_sprite(f"Status: {self.status_message}", status_color)
+        # putText 的 (20, 40) 是基线坐标，换算为精灵左上角
+        self._blit_sprite(frame, sprite, 20, 40 - sprite[2])
+
         # Recording indicator
         if self.is_recording:
-            cv2.circle(frame, (50, 80), 15, (0, 0, 255), -1)
-            cv2.putText(frame, "REC", (80, 90), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-        
+            self._blit_sprite(frame, self._get_rec_sprite(), 35, 62)
+
         return frame
     
     def update_status(self, message, is_processing=None, is_recording=None):
@@ -113,31 +217,50 @@ class CameraManager:
         Returns:
             tuple: (log_path, temp_path) 保存的文件路径
         """
-        # Apply perspective transform
-        warped_frame = detector.apply_perspective_transform(frame)
-        
+        # 检测、透视变换和JPEG编码都在检测器锁内完成：变换结果写在检测器
+        # 复用的_warp_buf里，并发快照（GPIO回调线程和Web线程可同时触发，
+        # is_processing要到本函数返回后才置位）会一边写缓冲一边编码，
+        # 产生撕裂的截图。RLock可重入，内层的检测/变换照常各自拿锁
+        with detector._detect_lock:
+            # 快照前用全分辨率重新检测一次角点（逐帧预览是半分辨率，精度不够）
+            detector.detect_white_square_with_black_border(frame)
+
+            # Apply perspective transform
+            warped_frame = detector.apply_perspective_transform(frame)
+
+            # 只编码一次JPEG（原来两次 imwrite 各编码一次）
+            ok, buf = cv2.imencode('.jpg', warped_frame, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        if not ok:
+            raise RuntimeError("JPEG encode failed")
+        jpg_bytes = buf.tobytes()
+
         # Generate filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"capture_{timestamp}.jpg"
-        
-               
-        # Create capture subdirectory
+
+
+        # Create capture subdirectory（每个目录只建一次，省掉每次快照的stat/mkdir）
         capture_dir = logs_dir / "capture"
-        capture_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Save to logs (permanent)
+        if str(capture_dir) not in self._made_dirs:
+            capture_dir.mkdir(parents=True, exist_ok=True)
+            self._made_dirs.add(str(capture_dir))
+
         log_path = capture_dir / filename
-        cv2.imwrite(str(log_path), warped_frame)
-        print(f"Saved to logs: {log_path}")
-        
-        # Save to temp (for processing)
         temp_path = temp_dir / filename
-        cv2.imwrite(str(temp_path), warped_frame)
-        
+
+        # 临时文件供AI流程立即读取，必须同步写
+        with open(temp_path, 'wb') as f:
+            f.write(jpg_bytes)
+
+        # 日志备份交给常驻写盘线程，调用方不等磁盘
+        self._io_q.put((temp_path, log_path, jpg_bytes))
+
         return log_path, temp_path
     
     def cleanup(self):
         """清理资源"""
+        # 通知写盘线程退出（已入队的任务会先写完）
+        self._io_q.put(None)
         if self.cap:
             self.cap.release()
         print("Camera resources cleaned up")
\ No newline at end of file
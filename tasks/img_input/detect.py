@@ -8,6 +8,7 @@ import cv2
 import numpy as np
 import yaml
 import os
+import threading
 from pathlib import Path
 from datetime import datetime
 
@@ -20,15 +21,25 @@ class SquareDetector:
         Args:
             camera_yaml_path: 相机标定参数文件路径
         """
-        # 加载相机标定参数
+        # 加载相机标定参数：优先用标定时同步生成的NPZ（np.load在C层重建
+        # 数组，比YAML解析嵌套列表快得多），NPZ不存在或比YAML旧时回退YAML
         print(f"正在加载相机参数: {camera_yaml_path}")
-        with open(camera_yaml_path, 'r', encoding='utf-8') as f:
-            camera_params = yaml.safe_load(f)
-        
-        self.camera_matrix = np.array(camera_params['camera_matrix'])
-        self.dist_coeffs = np.array(camera_params['dist_coeffs'])
-        self.image_width = camera_params['image_width']
-        self.image_height = camera_params['image_height']
+        npz_path = Path(camera_yaml_path).with_suffix('.npz')
+        if (npz_path.exists()
+                and npz_path.stat().st_mtime >= os.path.getmtime(camera_yaml_path)):
+            with np.load(str(npz_path)) as z:
+                self.camera_matrix = z['K']
+                self.dist_coeffs = z['D']
+                self.image_width = int(z['size'][0])
+                self.image_height = int(z['size'][1])
+        else:
+            with open(camera_yaml_path, 'r', encoding='utf-8') as f:
+                camera_params = yaml.safe_load(f)
+
+            self.camera_matrix = np.array(camera_params['camera_matrix'])
+            self.dist_coeffs = np.array(camera_params['dist_coeffs'])
+            self.image_width = camera_params['image_width']
+            self.image_height = camera_params['image_height']
         
         # 存储检测到的四个角点
         self.corners = []
@@ -40,25 +51,114 @@ class SquareDetector:
         
         # 目标输出尺寸(px)
         self.target_size_px = 720  # 180mm对应720px，即每毫米约4px
-        
+
+        # 透视变换复用的目标角点和输出缓冲区（每次快照省一次大块分配）
+        ts = self.target_size_px
+        self._target_square = np.float32([
+            [0, 0],                    # 左上
+            [ts - 1, 0],               # 右上
+            [ts - 1, ts - 1],          # 右下
+            [0, ts - 1]                # 左下
+        ])
+        self._warp_buf = np.empty((ts, ts, 3), dtype=np.uint8)
+
+        # 去畸变映射表缓存：按帧尺寸缓存initUndistortRectifyMap的结果，
+        # 逐帧只做remap查表，省去每帧重算畸变多项式
+        self._undistort_maps = {}
+
+        # 灰度/模糊/二值化的逐帧复用缓冲，按帧尺寸缓存
+        # （全分辨率快照路径和半分辨率预览路径各自一套）
+        self._scratch_bufs = {}
+
+        # 检测/变换串行化锁：主循环预览和快照（GPIO回调线程、Web线程）
+        # 共用一个检测器实例，corners和复用缓冲不能并发读写
+        self._detect_lock = threading.RLock()
+
+        # 畸变系数接近零时remap等价于恒等变换，直接跳过
+        self._needs_undistort = bool(np.linalg.norm(self.dist_coeffs) > 1e-3)
+        if not self._needs_undistort:
+            print("畸变系数接近零，跳过逐帧去畸变")
+
         print("SquareDetector初始化完成！")
 
+    def _matrix_for_size(self, w, h):
+        """把标定分辨率下的内参等比缩放到目标帧尺寸
+
+        标定在 image_width x image_height 下完成，实际采集分辨率可能不同
+        （如720p标定、960x540采集），fx/cx按宽、fy/cy按高缩放后才对得上
+        """
+        m = self.camera_matrix.copy()
+        m[0] *= w / self.image_width
+        m[1] *= h / self.image_height
+        return m
+
+    def _undistort(self, frame):
+        """去畸变：映射表只按尺寸算一次，之后走CV_16SC2定点remap"""
+        if not self._needs_undistort:
+            # 无畸变时不remap；仍复制一份，后续标注不会画到调用方的原帧上
+            return frame.copy()
+
+        h, w = frame.shape[:2]
+        maps = self._undistort_maps.get((w, h))
+        if maps is None:
+            matrix = self._matrix_for_size(w, h)
+            map1, map2 = cv2.initUndistortRectifyMap(
+                matrix, self.dist_coeffs, None,
+                matrix, (w, h), cv2.CV_16SC2)
+            maps = (map1, map2)
+            self._undistort_maps[(w, h)] = maps
+        return cv2.remap(frame, maps[0], maps[1], cv2.INTER_LINEAR)
+
+    @staticmethod
+    def _side_ratio_ok(pts, threshold):
+        """四边形边长比检查：最长边不超过最短边的threshold倍
+
+        向量化一次算四条边的平方长度，比较平方值省掉开方，
+        替代逐边调用np.linalg.norm的Python循环
+        """
+        d = pts.astype(np.float64) - np.roll(pts, -1, axis=0).astype(np.float64)
+        s2 = (d * d).sum(axis=1)
+        min_s2 = s2.min()
+        if min_s2 <= 0:
+            return False
+        return s2.max() / min_s2 <= threshold * threshold
+
+    def _min_area(self, shape, base):
+        """把标定分辨率下调好的面积门限按当前帧像素量等比缩放
+
+        预览走pyrDown半分辨率、采集分辨率也可能低于标定分辨率，
+        绝对面积阈值不缩放的话小帧上需要大得多的目标才能过门限
+        """
+        return base * (shape[0] * shape[1]) / (self.image_height * self.image_width)
+
     def detect_white_square_with_black_border(self, frame):
         """
         检测180mm白色正方形和内部20mm黑色边框
         识别一个180mm的正方形，内部有20mm宽的黑框，形成一个140mm的内部白色区域
         """
-        # 畸变矫正
-        undistorted_frame = cv2.undistort(frame, self.camera_matrix, self.dist_coeffs)
-        
+        with self._detect_lock:
+            return self._detect_white_square_impl(frame)
+
+    def _detect_white_square_impl(self, frame):
+        """检测实现：调用方需持有_detect_lock"""
+        # 畸变矫正（缓存映射表的remap，见_undistort）
+        undistorted_frame = self._undistort(frame)
+        
+        # 灰度/模糊/二值化写入复用缓冲，免去每帧三次大块分配
+        shape = undistorted_frame.shape[:2]
+        bufs = self._scratch_bufs.get(shape)
+        if bufs is None:
+            bufs = tuple(np.empty(shape, np.uint8) for _ in range(3))
+            self._scratch_bufs[shape] = bufs
+
         # 转换为灰度图
-        gray = cv2.cvtColor(undistorted_frame, cv2.COLOR_BGR2GRAY)
-        
+        gray = cv2.cvtColor(undistorted_frame, cv2.COLOR_BGR2GRAY, dst=bufs[0])
+
         # 高斯模糊以减少噪声
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-        
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0, dst=bufs[1])
+
         # 使用Otsu自动阈值方法进行二值化
-        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        _, thresh = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=bufs[2])
         
         # 寻找轮廓
         contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -66,13 +166,14 @@ class SquareDetector:
         # 寻找最大的四边形轮廓（假设是我们的外部白色正方形）
         largest_contour = None
         max_area = 0
-        
+        min_area = self._min_area(shape, 5000)
+
         for contour in contours:
             # 计算轮廓面积
             area = cv2.contourArea(contour)
-            
-            # 过滤掉太小的轮廓
-            if area < 5000:
+
+            # 过滤掉太小的轮廓（门限随帧像素量缩放，见_min_area）
+            if area < min_area:
                 continue
             
             # 近似轮廓为多边形
@@ -84,25 +185,8 @@ class SquareDetector:
                 # 检查凸性
                 if cv2.isContourConvex(approx):
                     # 添加边长筛选，剔除不够正方形的目标
-                    # 计算四条边的长度
-                    pts = approx.reshape(4, 2)
-                    sides = []
-                    for i in range(4):
-                        p1 = pts[i]
-                        p2 = pts[(i+1)%4]
-                        side_length = np.linalg.norm(p1 - p2)
-                        sides.append(side_length)
-                    
-                    # 计算边长的最大值和最小值
-                    sides = np.array(sides)
-                    max_side = np.max(sides)
-                    min_side = np.min(sides)
-                    
-                    # 计算边长比例，如果最长边不超过最短边的一定倍数，则认为是正方形
-                    aspect_ratio = max_side / min_side if min_side > 0 else float('inf')
-                    aspect_threshold = 1.5  # 设定长宽比阈值，可根据实际情况调整
-                    
-                    if aspect_ratio <= aspect_threshold:
+                    # （1.5为长宽比阈值，可根据实际情况调整）
+                    if self._side_ratio_ok(approx.reshape(4, 2), 1.5):
                         max_area = area
                         largest_contour = approx
         
@@ -144,6 +228,29 @@ class SquareDetector:
         
         return undistorted_frame, thresh
 
+    def detect_preview(self, frame):
+        """
+        半分辨率预览检测：pyrDown后像素量只有1/4，角点再放大回原尺寸
+
+        仅用于逐帧取景反馈；快照路径仍应走全分辨率检测保证角点精度
+        """
+        small = cv2.pyrDown(frame)
+
+        # 去畸变映射表按帧尺寸自动缩放内参（见_matrix_for_size），
+        # 半分辨率帧不需要再临时替换相机矩阵。
+        # 检测和角点放大必须在同一临界区内完成：否则快照线程的全分辨率
+        # 检测插在中间时，这里会把人家刚检出的角点再放大一倍
+        with self._detect_lock:
+            prev_corners = self.corners
+            annotated_small, _ = self._detect_white_square_impl(small)
+
+            # 本帧检测成功时，把角点坐标放大回全分辨率
+            if self.corners is not prev_corners and len(self.corners) == 4:
+                self.corners = self.corners * 2.0
+
+        # 放大回原尺寸供取景显示
+        return cv2.pyrUp(annotated_small)
+
     def detect_inner_white_square_from_black_border(self, gray_image, outer_contour):
         """
         通过检测黑色厚边框的内圈来识别内部的白色正方形
@@ -162,17 +269,21 @@ class SquareDetector:
         _, thresh_roi = cv2.threshold(blurred_roi, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
         
         # 寻找轮廓（这里我们寻找黑色边框的轮廓）
-        contours, _ = cv2.findContours(thresh_roi, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        
+        # 层级信息没有用到，RETR_LIST返回同一组轮廓但省去构建层级树
+        contours, _ = cv2.findContours(thresh_roi, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        # 面积门限随帧像素量缩放（预览是半分辨率帧）
+        min_area = self._min_area(gray_image.shape, 1000)
+
         # 寻找位于外轮廓内部的黑色边框
         for contour in contours:
             # 转换轮廓坐标到全图坐标系
             converted_contour = contour.copy()
             converted_contour[:, :, 0] += x
             converted_contour[:, :, 1] += y
-            
+
             # 检查轮廓是否在外部白色正方形内部
-            if cv2.contourArea(converted_contour) < 1000:  # 忽略过小的轮廓
+            if cv2.contourArea(converted_contour) < min_area:  # 忽略过小的轮廓
                 continue
                 
             # 近似为多边形
@@ -211,12 +322,13 @@ class SquareDetector:
         # 使用Otsu阈值找到内部白色区域
         _, thresh_roi = cv2.threshold(blurred_roi, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
         
-        # 查找内部的白色轮廓
-        inner_contours, _ = cv2.findContours(thresh_roi, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        
+        # 查找内部的白色轮廓（同样不需要层级信息）
+        inner_contours, _ = cv2.findContours(thresh_roi, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
         max_inner_area = 0
         best_inner_contour = None
-        
+        min_area = self._min_area(gray_image.shape, 1000)
+
         for inner_contour in inner_contours:
             # 转换轮廓坐标到全图坐标系
             converted_contour = inner_contour.copy()
@@ -227,33 +339,20 @@ class SquareDetector:
             area = cv2.contourArea(converted_contour)
             
             # 检查是否在黑色边框内部
-            if area > 1000:  # 过滤小轮廓
+            if area > min_area:  # 过滤小轮廓（门限随帧像素量缩放）
                 # 近似为多边形
                 epsilon = 0.02 * cv2.arcLength(converted_contour, True)
                 approx = cv2.approxPolyDP(converted_contour, epsilon, True)
                 
                 # 检查是否为四边形且面积适中
                 if len(approx) == 4 and cv2.isContourConvex(approx):
-                    # 计算边长比例，确保是接近正方形的形状
-                    pts = approx.reshape(4, 2)
-                    sides = []
-                    for i in range(4):
-                        p1 = pts[i]
-                        p2 = pts[(i+1)%4]
-                        side_length = np.linalg.norm(p1 - p2)
-                        sides.append(side_length)
-                    
-                    sides = np.array(sides)
-                    max_side = np.max(sides)
-                    min_side = np.min(sides)
-                    
-                    aspect_ratio = max_side / min_side if min_side > 0 else float('inf')
-                    
                     # 检查是否在黑色边框内部
                     mbr = cv2.boundingRect(converted_contour)
                     center_x, center_y = mbr[0] + mbr[2]//2, mbr[1] + mbr[3]//2
-                    
-                    if cv2.pointPolygonTest(black_border_contour, (center_x, center_y), False) >= 0 and aspect_ratio <= 1.2:
+
+                    # 边长比例检查确保是接近正方形的形状
+                    if (cv2.pointPolygonTest(black_border_contour, (center_x, center_y), False) >= 0
+                            and self._side_ratio_ok(approx.reshape(4, 2), 1.2)):
                         if area > max_inner_area:
                             max_inner_area = area
                             best_inner_contour = approx
@@ -312,29 +411,13 @@ class SquareDetector:
         # 计算中心位置
         center = (target_size // 2, target_size // 2)
         
-        # 创建掩码来突出黑色边框区域（在外部白色区域和内部白色区域之间的环形区域）
-        mask = np.zeros_like(gray_warped)
-        
-        # 先标记内部白色区域为1（不感兴趣）
-        cv2.rectangle(mask, 
-                     (center[0] - inner_size_px//2, center[1] - inner_size_px//2),
-                     (center[0] + inner_size_px//2, center[1] + inner_size_px//2), 
-                     1, -1)
-        
-        # 标记外部白色区域为2（感兴趣）
-        cv2.rectangle(mask, 
-                     (center[0] - outer_size_px//2, center[1] - outer_size_px//2),
-                     (center[0] + outer_size_px//2, center[1] + outer_size_px//2), 
-                     2, -1)
-        
-        # 将内部区域设为0（不感兴趣）
-        cv2.rectangle(mask, 
-                     (center[0] - inner_size_px//2, center[1] - inner_size_px//2),
-                     (center[0] + inner_size_px//2, center[1] + inner_size_px//2), 
-                     0, -1)
-        
-        # 选择只包含边框区域的像素
-        border_region = np.where(mask == 2, gray_warped, 0)
+        # 感兴趣的是内外白色区域之间的轴对齐环形区域：直接把中心内部
+        # 区域切片置零即可，不必画掩码再np.where整幅过滤
+        # （外圈矩形本就覆盖整幅变换结果，环外没有需要排除的像素）
+        border_region = gray_warped.copy()
+        h = inner_size_px // 2
+        border_region[center[1] - h:center[1] + h + 1,
+                      center[0] - h:center[0] + h + 1] = 0
         
         # 使用Otsu自动阈值方法寻找黑色边框的轮廓
         # 因为我们寻找黑色区域，所以使用THRESH_BINARY_INV
@@ -363,31 +446,32 @@ class SquareDetector:
         """
         对输入帧应用透视变换，将检测到的四个角点变换为矩形
         """
+        # 和检测共用一把锁：读corners、写_warp_buf都不能和检测并发
+        with self._detect_lock:
+            return self._apply_perspective_impl(frame)
+
+    def _apply_perspective_impl(self, frame):
+        """透视变换实现：调用方需持有_detect_lock"""
         if len(self.corners) != 4:
             # 如果没有检测到4个角点，返回原图
             return frame
-        
-        # 先对整个图像进行去畸变处理
-        undistorted_frame = cv2.undistort(frame, self.camera_matrix, self.dist_coeffs)
+
+        # 先对整个图像进行去畸变处理（走缓存映射表的remap；
+        # 不能复用检测阶段的去畸变帧——那份上面已画了轮廓标注）
+        undistorted_frame = self._undistort(frame)
         
         # 获取当前角点
         corners = self.corners
-        
-        # 定义目标矩形的四个角点
+
+        # 计算透视变换矩阵（目标角点在初始化时缓存）
         target_size = self.target_size_px
-        target_square = np.float32([
-            [0, 0],                    # 左上
-            [target_size - 1, 0],      # 右上
-            [target_size - 1, target_size - 1],  # 右下
-            [0, target_size - 1]       # 左下
-        ])
-        
-        # 计算透视变换矩阵
-        matrix = cv2.getPerspectiveTransform(corners, target_square)
-        
-        # 应用透视变换
-        warped = cv2.warpPerspective(undistorted_frame, matrix, (target_size, target_size))
-        
+        matrix = cv2.getPerspectiveTransform(corners, self._target_square)
+
+        # 应用透视变换：写入预分配缓冲区，避免每次分配约1.5MB输出
+        warped = cv2.warpPerspective(
+            undistorted_frame, matrix, (target_size, target_size), dst=self._warp_buf
+        )
+
         return warped
 
     def run(self, camera_id=0):
@@ -10,16 +10,18 @@ class GPIOButton:
     一个模拟键盘按键行为的GPIO输入类。
     支持“状态查询”（是否被按下）和“事件驱动”（按一次触发一次）。
     """
-    def __init__(self, input_pin, active_low=True, bouncetime=200):
+    def __init__(self, input_pin, active_low=True, bouncetime=200, press_callback=None):
         """
         初始化GPIO按键。
         :param input_pin: GPIO管脚编号 (BOARD编码).
         :param active_low: 如果为True，则低电平表示按下（使用内部上拉电阻）。
                            如果为False，则高电平表示按下（使用内部下拉电阻）。
         :param bouncetime: 消抖时间 (毫秒).
+        :param press_callback: 可选。按下时在中断线程直接回调，免去轮询。
         """
         self.input_pin = input_pin
         self.active_low = active_low
+        self.press_callback = press_callback
         self._pressed_event = False
         self.last_press_time = 0
         self.cooldown = bouncetime / 1000.0  # 转换为秒
@@ -67,6 +69,13 @@ class GPIOButton:
         self.last_press_time = current_time
         self._pressed_event = True
 
+        # 事件驱动模式：直接在中断线程回调，调用方不必再轮询 get_press()
+        if self.press_callback:
+            try:
+                self.press_callback()
+            except Exception as e:
+                print(f"按键回调执行出错 (Pin {self.input_pin}): {e}")
+
     def is_pressed(self):
         if self.active_low:
             return GPIO.input(self.input_pin) == GPIO.LOW
@@ -2,33 +2,40 @@
 AI管理器 - 负责AI流程管理、语音处理和AI pipeline协调
 """
 import threading
+import hashlib
 import json
 import os
 import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 import urllib.request
 import uuid
 
+from PIL import Image
+
 
 class AIManager:
-    def __init__(self, global_config, vision_agent, solution_agent, image_agent, voice_handler=None):
+    def __init__(self, global_config, vision_agent, solution_agent, image_agent, voice_handler=None, combined_agent=None):
         """
         初始化AI管理器
-        
+
         Args:
             global_config: 全局配置
             vision_agent: 视觉分析代理
             solution_agent: 解决方案代理
             image_agent: 图像生成代理
             voice_handler: 语音处理器(可选)
+            combined_agent: 视觉+方案合并代理(可选，一次调用省一个往返)
         """
         self.global_config = global_config
         self.vision_agent = vision_agent
         self.solution_agent = solution_agent
         self.image_agent = image_agent
         self.voice_handler = voice_handler
+        self.combined_agent = combined_agent
         
         # AI状态
         self.is_processing = False
@@ -43,16 +50,38 @@ class AIManager:
         # 事件回调
         self.event_callback = None
 
+        # 防止并发快照互相覆盖 last_* 结果
+        self._pipeline_lock = threading.Lock()
+
+        # 流程线程池 + 信号量：连按快门不再无限起线程，超出并发直接报忙
+        # 注：不做跨快照的三级流水线——设备是单用户交互，新快照会直接
+        # 报忙而不是排队，阶段重叠只在单次快照内部做（方案与图片并行）
+        self._ai_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ai")
+        self._ai_sem = threading.BoundedSemaphore(1)
+
+        # 视觉结果缓存：按感知哈希去重，同一张画重复拍照不再重复调用视觉模型
+        self._vision_cache = OrderedDict()  # hash -> vision_result
+        self._vision_cache_max = 64
+
+        # 方案结果缓存：按视觉结果内容哈希去重，相同分析不再重复生成方案
+        self._solution_cache = OrderedDict()  # hash -> solution_result
+        self._solution_cache_max = 32
+
         # 日志目录
         base_dir = Path(__file__).resolve().parents[2]
         self.log_dir = base_dir / "logs" / "ai_logs"
         self.log_images_dir = self.log_dir / "images"
+        self.capture_dir = base_dir / "logs" / "capture"
         self.log_dir.mkdir(parents=True, exist_ok=True)
         self.log_images_dir.mkdir(parents=True, exist_ok=True)
+        self.capture_dir.mkdir(parents=True, exist_ok=True)
 
         # 当前对话日志文件
         self.current_log_path = None
 
+        # 用历史快照的 (jpg, json) 对预热视觉缓存，重启后老画作免网络调用
+        self._preload_capture_cache()
+
     def reset_results(self):
         """清空上一次结果，避免前端拉取到旧数据。"""
         self.last_vision_result = None
@@ -79,6 +108,9 @@ class AIManager:
                 print("[AIManager] AI任务超时，强制中断")
                 self.is_processing = False
         
+        # 关闭流程线程池（不等待在途任务）
+        self._ai_pool.shutdown(wait=False)
+
         # 清理结果
         self.reset_results()
         print("[AIManager] 清理完成")
@@ -215,6 +247,114 @@ class AIManager:
             print(f"[AIManager] Download image failed: {e}")
             return None
 
+    def _preload_capture_cache(self):
+        """扫描历史快照的JSON side-car，按感知哈希预热视觉缓存"""
+        try:
+            sidecars = sorted(self.capture_dir.glob("capture_*.json"))
+        except Exception:
+            return
+
+        # 只取最近的一批，避免启动时扫描过多文件
+        for sidecar in sidecars[-self._vision_cache_max:]:
+            try:
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    final_output = json.load(f)
+
+                vision_result = final_output.get("vision")
+                if not vision_result:
+                    continue
+
+                image_path = sidecar.with_suffix(".jpg")
+                if image_path.exists():
+                    image_hash = self._perceptual_hash(image_path)
+                    self._vision_cache_put(image_hash, vision_result)
+
+                # 用最新一份结果恢复上下文，重启后语音对话立即可用
+                self.last_vision_result = vision_result
+                solution_result = final_output.get("solution")
+                if solution_result:
+                    self.last_solution_result = solution_result
+                    if self.solution_agent is not None:
+                        self.solution_agent.current_solution = solution_result
+                    # 方案缓存也一并预热：重启后重复快照两级全免调用
+                    self._solution_cache[self._vision_key(vision_result)] = solution_result
+                    while len(self._solution_cache) > self._solution_cache_max:
+                        self._solution_cache.popitem(last=False)
+            except Exception as e:
+                print(f"[AIManager] Preload sidecar failed ({sidecar.name}): {e}")
+
+        if self._vision_cache:
+            print(f"[AIManager] Preloaded {len(self._vision_cache)} cached vision results")
+
+    def _write_capture_sidecar(self, image_path, final_output: dict):
+        """把完整结果写到快照旁的JSON side-car，供下次重启复用"""
+        try:
+            sidecar = self.capture_dir / (Path(image_path).stem + ".json")
+            with open(sidecar, "w", encoding="utf-8") as f:
+                json.dump(final_output, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"[AIManager] Write sidecar failed: {e}")
+
+    @staticmethod
+    def _perceptual_hash(image_path) -> str | None:
+        """8x8 均值哈希：对压缩/缩放不敏感，用于识别重复/近似的快照"""
+        try:
+            img = Image.open(image_path).convert("L").resize((8, 8), Image.Resampling.LANCZOS)
+            pixels = list(img.getdata())
+            avg = sum(pixels) / len(pixels)
+            bits = 0
+            for p in pixels:
+                bits = (bits << 1) | (1 if p >= avg else 0)
+            return f"{bits:016x}"
+        except Exception as e:
+            print(f"[AIManager] Hash image failed: {e}")
+            return None
+
+    @staticmethod
+    def _content_hash(image_path) -> str | None:
+        """文件字节的 BLAKE2b 哈希：字节级相同的快照零成本命中"""
+        try:
+            data = Path(image_path).read_bytes()
+            return hashlib.blake2b(data, digest_size=16).hexdigest()
+        except Exception as e:
+            print(f"[AIManager] Hash file failed: {e}")
+            return None
+
+    @staticmethod
+    def _vision_key(vision_result) -> str:
+        """视觉结果的稳定哈希，作为方案缓存的键"""
+        return hashlib.blake2b(
+            json.dumps(vision_result, sort_keys=True, ensure_ascii=False).encode("utf-8"),
+            digest_size=16
+        ).hexdigest()
+
+    def _vision_cache_get(self, image_hash, fuzzy=False, max_distance=5):
+        if not image_hash:
+            return None
+        if image_hash in self._vision_cache:
+            self._vision_cache.move_to_end(image_hash)
+            return self._vision_cache[image_hash]
+
+        # 模糊匹配：同一块白板的两次拍摄只差几个像素，精确哈希会失配
+        # 对64位感知哈希按汉明距离容忍少量翻转位（仅扫16位hex的感知哈希键）
+        if fuzzy and len(image_hash) == 16:
+            target = int(image_hash, 16)
+            for key in self._vision_cache:
+                if len(key) != 16:
+                    continue
+                if bin(target ^ int(key, 16)).count('1') <= max_distance:
+                    self._vision_cache.move_to_end(key)
+                    return self._vision_cache[key]
+        return None
+
+    def _vision_cache_put(self, image_hash, vision_result):
+        if not image_hash or not vision_result:
+            return
+        self._vision_cache[image_hash] = vision_result
+        self._vision_cache.move_to_end(image_hash)
+        while len(self._vision_cache) > self._vision_cache_max:
+            self._vision_cache.popitem(last=False)
+
     def _format_solution_text(self, solution_result: dict) -> str:
         """将方案结果整理为分段要点，便于上位机展示"""
         if not solution_result:
@@ -253,44 +393,116 @@ class AIManager:
         Args:
             image_path: 图像路径
         """
+        # 代理在后台线程初始化，开机后立刻拍照可能还没就绪
+        if self.solution_agent is None:
+            print("AI agents not ready yet.")
+            self._push_event("error", "AI模块尚未就绪，请稍候再试")
+            return
+
         self.is_processing = True
         self.status_message = "Analyzing Image..."
         self._push_event("processing", "Analyzing Image...")
 
         # 新的一次分析视为新对话
         self._start_new_log_session()
-        
+
+        # 同一时间只允许一个pipeline在跑，避免并发快照互相覆盖 last_* 结果
+        self._pipeline_lock.acquire()
+
         try:
             print("\n--- Starting AI Pipeline ---")
             
             # 清除旧的对话记忆，开始新的分析
             self.solution_agent.clear_memory()
-            
-            # Step 1: Vision Analysis
-            self._push_event("processing", "Vision Analysis...")
-            vision_result = self.vision_agent.analyze(str(image_path))
-            if not vision_result:
-                print("Vision analysis failed.")
-                self.status_message = "Vision Failed"
-                return
+
+            # Step 0: 先查缓存（字节哈希→感知哈希→方案缓存），
+            # 重复快照不付任何远程调用——合并代理也一样被跳过
+            vision_result = None
+            solution_result = None
+            vision_key = None
+            exact_hash = self._content_hash(image_path)
+            image_hash = None
+            vision_result = self._vision_cache_get(exact_hash)
+            if vision_result:
+                print("[AIManager] Vision cache hit (content hash)")
+            else:
+                image_hash = self._perceptual_hash(image_path)
+                vision_result = self._vision_cache_get(image_hash, fuzzy=True)
+                if vision_result:
+                    print("[AIManager] Vision cache hit (perceptual hash)")
+
+            if vision_result:
+                # 视觉结果命中时顺带查方案缓存，两级全中则整个流程零调用
+                vision_key = self._vision_key(vision_result)
+                solution_result = self._solution_cache.get(vision_key)
+                if solution_result:
+                    print("[AIManager] Solution cache hit")
+                    self._solution_cache.move_to_end(vision_key)
+                    # 同步到 solution_agent，保证后续 chat() 仍有上下文
+                    self.solution_agent.current_solution = solution_result
+
+            # Step 1+2: 视觉没命中时优先走合并代理（一次调用同时拿到两样）
+            if vision_result is None and self.combined_agent:
+                self._push_event("processing", "Vision + Solution...")
+                combined = self.combined_agent.analyze_and_solve(str(image_path))
+                if combined:
+                    vision_result = combined.get("vision")
+                    solution_result = combined.get("solution")
+                    # 同步方案到 solution_agent，保证后续 chat() 仍有上下文
+                    self.solution_agent.current_solution = solution_result
+                else:
+                    print("Combined analysis failed. Falling back to two-stage pipeline.")
+
+            if vision_result is None:
+                # Step 1: Vision Analysis
+                self._push_event("processing", "Vision Analysis...")
+                vision_result = self.vision_agent.analyze(str(image_path))
+                if not vision_result:
+                    print("Vision analysis failed.")
+                    self.status_message = "Vision Failed"
+                    return
+
+            # 不管结果来自哪个代理都写回视觉缓存（感知哈希兜底模糊匹配）
+            if image_hash is not None:
+                self._vision_cache_put(image_hash, vision_result)
+            self._vision_cache_put(exact_hash, vision_result)
 
             # 记录用户图片日志
             self._log_image("user", str(image_path))
-            
+
             # Save vision result
             self.last_vision_result = vision_result
-            
+
             print(f"Vision Result: {vision_result.get('project_title', 'Unknown')}")
-            self.status_message = "Generating Solution..."
-            self._push_event("processing", "Generating Solution...", {"vision": vision_result})
-            
-            # Step 2: Solution Generation
-            solution_result = self.solution_agent.generate(vision_result)
+
             if not solution_result:
-                print("Solution generation failed.")
-                self.status_message = "Solution Failed"
-                return
-            
+                self.status_message = "Generating Solution..."
+                self._push_event("processing", "Generating Solution...", {"vision": vision_result})
+
+                # 先查方案缓存：同一份视觉分析不重复生成方案
+                vision_key = self._vision_key(vision_result)
+                solution_result = self._solution_cache.get(vision_key)
+                if solution_result:
+                    print("[AIManager] Solution cache hit")
+                    self._solution_cache.move_to_end(vision_key)
+                    # 同步到 solution_agent，保证后续 chat() 仍有上下文
+                    self.solution_agent.current_solution = solution_result
+                else:
+                    # Step 2: 方案生成
+                    solution_result = self.solution_agent.generate(vision_result)
+                    if not solution_result:
+                        print("Solution generation failed.")
+                        self.status_message = "Solution Failed"
+                        return
+
+            # 方案写回缓存（合并代理的结果也要写，重复快照才真正免调用）
+            if vision_key is None:
+                vision_key = self._vision_key(vision_result)
+            if vision_key not in self._solution_cache:
+                self._solution_cache[vision_key] = solution_result
+                while len(self._solution_cache) > self._solution_cache_max:
+                    self._solution_cache.popitem(last=False)
+
             # Save solution result
             self.last_solution_result = solution_result
 
@@ -304,7 +516,12 @@ class AIManager:
             
             print(f"Solution: {solution_result.get('project_name')}")
             self.status_message = "Generating Preview..."
-            self._push_event("processing", "Generating Preview Image...")
+            # 方案一出来就先推给前端，预览图在后台继续生成
+            # （生图通常是最慢的一步，用户不用干等）
+            self._push_event("partial", "Generating Preview Image...", {
+                "vision": vision_result,
+                "solution": solution_result,
+            })
             
             # Step 3: Image Generation
             image_prompt = solution_result.get("image_prompt", "")
@@ -312,6 +529,7 @@ class AIManager:
             if image_prompt:
                 preview_url = self.image_agent.generate_image(image_prompt)
                 # 预取生成链接，避免前端首次加载时需要手动点开
+                # （拼URL本身是即时的，真正耗时的是这次预取下载）
                 if preview_url:
                     self._prefetch_preview_url(preview_url)
             
@@ -335,9 +553,14 @@ class AIManager:
             self.last_complete_result = final_output
             self.has_result = True
             
-            print("\n=== Final Result ===")
-            print(json.dumps(final_output, indent=2, ensure_ascii=False))
-            print("====================\n")
+            # 终端只打一行摘要，完整JSON已随快照落盘，避免大段输出拖慢串口终端
+            project_name = (solution_result or {}).get("project_name", "未命名")
+            steps = len((solution_result or {}).get("steps", []) or [])
+            materials = len((solution_result or {}).get("materials", []) or [])
+            print(f"\n=== Final Result: {project_name} | 步骤 {steps} | 材料 {materials} | 预览图 {'有' if preview_url else '无'} ===\n")
+
+            # 结果落盘到快照旁，供重启后的缓存预热复用
+            self._write_capture_sidecar(image_path, final_output)
             
             # Push complete event
             self._push_event("complete", "Analysis Complete!", final_output)
@@ -347,6 +570,7 @@ class AIManager:
             self.status_message = "Error in Pipeline"
             self._push_event("error", str(e))
         finally:
+            self._pipeline_lock.release()
             self.is_processing = False
 
     def _prefetch_preview_url(self, url: str):
@@ -371,10 +595,19 @@ class AIManager:
         threading.Thread(target=_fetch, daemon=True).start()
     
     def run_ai_pipeline_async(self, image_path):
-        """异步运行AI流程"""
-        thread = threading.Thread(target=self.run_ai_pipeline, args=(image_path,))
-        thread.daemon = True
-        thread.start()
+        """异步运行AI流程（线程池提交，带并发上限）"""
+        self._ai_pool.submit(self._run_ai_guarded, image_path)
+
+    def _run_ai_guarded(self, image_path):
+        """信号量门控：已有流程在跑时直接报忙，不排队堆积请求"""
+        if not self._ai_sem.acquire(blocking=False):
+            print("AI is busy, snapshot dropped.")
+            self._push_event("error", "AI正在处理中，请稍后再试")
+            return
+        try:
+            self.run_ai_pipeline(image_path)
+        finally:
+            self._ai_sem.release()
     
     def run_chat_ai(self, text):
         """
@@ -0,0 +1,24 @@
+"""
+共享 LLM 客户端池 - 相同 (api_key, base_url) 的代理复用同一个 OpenAI 客户端
+三个代理各建一个客户端意味着3份连接池和3次TLS握手；共用之后并行阶段也走同一个热连接。
+"""
+import threading
+from openai import OpenAI
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(api_key: str, base_url: str) -> OpenAI:
+    """获取（必要时创建）按凭据缓存的共享客户端
+
+    需要不同超时/重试参数的调用方请使用 client.with_options(...)，
+    它返回的副本仍然共享底层HTTP连接池。
+    """
+    key = (api_key, base_url)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(api_key=api_key, base_url=base_url)
+            _clients[key] = client
+        return client
@@ -1,6 +1,7 @@
 import json
 import re
-from openai import OpenAI
+
+from llm_client import get_client
 
 class SolutionAgent:
     """
@@ -13,12 +14,11 @@ class SolutionAgent:
         """
         self.cfg = config["solution_generator"]
 
-        self.client = OpenAI(
-            api_key=self.cfg["api_key"],
-            base_url=self.cfg["base_url"],
-            timeout=120,
-            max_retries=3
-        )
+        # 共享客户端池：相同凭据的代理复用同一个HTTP连接池
+        self.client = get_client(
+            self.cfg["api_key"],
+            self.cfg["base_url"]
+        ).with_options(timeout=120, max_retries=3)
         self.model = self.cfg["model_name"]
         self.history = []
         
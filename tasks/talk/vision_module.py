@@ -3,7 +3,8 @@ import json
 import re
 from io import BytesIO
 from PIL import Image
-from openai import OpenAI
+
+from llm_client import get_client
 
 class VisionAgent:
     def __init__(self, config):
@@ -15,11 +16,11 @@ class VisionAgent:
         # 根据 yaml 结构提取视觉配置
         self.vision_cfg = config["vision"]
 
-        self.client = OpenAI(
-            api_key=self.vision_cfg["api_key"],
-            base_url=self.vision_cfg["base_url"],
-            timeout=60
-        )
+        # 共享客户端池：相同凭据的代理复用同一个HTTP连接池
+        self.client = get_client(
+            self.vision_cfg["api_key"],
+            self.vision_cfg["base_url"]
+        ).with_options(timeout=60)
 
     def _extract_json_from_text(self, text):
         if not text:
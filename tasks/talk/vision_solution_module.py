@@ -0,0 +1,128 @@
+import base64
+import json
+import re
+from io import BytesIO
+from PIL import Image
+
+from llm_client import get_client
+
+class VisionSolutionAgent:
+    """
+    视觉识别 + 方案生成 合并代理
+    一次多模态调用同时产出视觉分析和完整方案，省掉一次远程往返
+    """
+
+    def __init__(self, config):
+        """
+        初始化：复用视觉通道的多模态模型，拼接两段 Prompt
+        """
+        self.full_config = config
+        self.vision_cfg = config["vision"]
+        self.solution_cfg = config["solution_generator"]
+
+        # 共享客户端池：与 VisionAgent 复用同一个HTTP连接池
+        self.client = get_client(
+            self.vision_cfg["api_key"],
+            self.vision_cfg["base_url"]
+        ).with_options(timeout=120)
+
+    def _extract_json_from_text(self, text):
+        if not text:
+            return None
+
+        # 1. 移除 Markdown 代码块标记
+        cleaned_text = re.sub(r"```json\s*", "", text, flags=re.IGNORECASE)
+        cleaned_text = re.sub(r"```", "", cleaned_text).strip()
+
+        # 2. 尝试直接解析
+        try:
+            return json.loads(cleaned_text)
+        except json.JSONDecodeError:
+            pass
+
+        # 3. 正则暴力提取 {} 包裹的内容
+        try:
+            match = re.search(r"(\{[\s\S]*\})", text)
+            if match:
+                return json.loads(match.group(1))
+        except:
+            pass
+
+        return None
+
+    def _process_image_to_base64(self, image_path):
+        try:
+            target_min_size = self.vision_cfg["target_min_size"]
+
+            img = Image.open(image_path).convert("RGB")
+            w, h = img.size
+
+            # 放大逻辑
+            if min(w, h) < target_min_size:
+                scale = target_min_size / min(w, h)
+                new_size = (int(w * scale), int(h * scale))
+                img = img.resize(new_size, Image.Resampling.LANCZOS)
+                print(f" [Vision+Solution] 图片已放大: {w}x{h} -> {new_size[0]}x{new_size[1]}")
+
+            buffered = BytesIO()
+            img.save(buffered, format="JPEG")
+            return base64.b64encode(buffered.getvalue()).decode("utf-8")
+        except Exception as e:
+            print(f" 图片处理失败: {e}")
+            return None
+
+    def _build_combined_prompt(self) -> str:
+        """把视觉 Prompt 和方案 Prompt 拼成一次调用"""
+        vision_prompt = self.vision_cfg["prompt"]
+        solution_prompt = self.solution_cfg["prompt"]
+
+        return f"""请在一次回复中完成以下两个任务：
+
+【任务一：视觉分析】
+{vision_prompt}
+
+【任务二：方案生成】
+基于任务一的分析结果，完成：
+{solution_prompt}
+
+请务必只输出纯 JSON，不要包含 Markdown 标记，格式如下：
+{{"vision": <任务一的JSON结果>, "solution": <任务二的JSON结果>}}"""
+
+    def analyze_and_solve(self, image_path):
+        """
+        对外接口：一次调用返回 {"vision": ..., "solution": ...}
+        失败时返回 None，由调用方回退到两段式流程
+        """
+        base64_image = self._process_image_to_base64(image_path)
+        if not base64_image:
+            return None
+
+        print(f" [Vision+Solution] 正在合并调用模型: {self.vision_cfg['model_name']}...")
+
+        try:
+            response = self.client.chat.completions.create(
+                model=self.vision_cfg["model_name"],
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": self._build_combined_prompt()},
+                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+                        ]
+                    }
+                ]
+            )
+
+            raw_content = response.choices[0].message.content
+            result = self._extract_json_from_text(raw_content)
+
+            # 两个字段都齐全才算成功
+            if result and result.get("vision") and result.get("solution"):
+                return result
+
+            print(" [Vision+Solution] 返回缺少 vision/solution 字段")
+            return None
+
+        except Exception as e:
+            print(f" 合并请求错误: {e}")
+            return None
@@ -1,6 +1,14 @@
 
+import json
 import time
-from flask import Flask, render_template, request, jsonify
+import uuid
+import hashlib
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, render_template, request, jsonify, Response
+
+from semcache import SimilarityCache
 
 
 # ==========================================
@@ -17,6 +25,36 @@ class CreativeDemoAgent:
 
         # 2. 直接返回写死的测试数据
         # 无论用户输入什么，都会返回这个结果
+        return self._mock_result()
+
+    def generate_streaming(self, user_idea: str):
+        """分阶段产出结果 (vision -> solution -> image)，前端可以边生成边展示"""
+        result = self._mock_result()
+
+        # 阶段1: 视觉理解/基本构思
+        time.sleep(0.8)
+        yield {"stage": "vision", "data": {
+            "project_name": result["project_name"],
+            "target_user": result["target_user"],
+            "difficulty": result["difficulty"],
+            "core_idea": result["core_idea"],
+        }}
+
+        # 阶段2: 方案细节
+        time.sleep(0.8)
+        yield {"stage": "solution", "data": {
+            "materials": result["materials"],
+            "steps": result["steps"],
+            "learning_outcomes": result["learning_outcomes"],
+        }}
+
+        # 阶段3: 预览图
+        time.sleep(0.4)
+        yield {"stage": "image", "data": {
+            "preview_image": result["preview_image"],
+        }}
+
+    def _mock_result(self) -> dict:
         mock_result = {
             "project_name": "火星探测全向车 (UI测试)",
             "target_user": "初中一年级",
@@ -54,8 +92,114 @@ class CreativeDemoAgent:
 # ==========================================
 app = Flask(__name__)
 
-# 不需要 API KEY 了
-agent = CreativeDemoAgent()
+# Agent 单例：整个进程只构建一次（真实模式下构建会建立HTTP会话/TLS连接，开销不小）
+_agent = None
+_agent_lock = threading.Lock()
+
+
+def get_agent() -> CreativeDemoAgent:
+    """惰性获取 Agent 单例，首次调用时才构建"""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                # 不需要 API KEY 了
+                _agent = CreativeDemoAgent()
+    return _agent
+
+# 结果缓存：相同创意文本直接命中，省掉重复的模型调用（真实模式下是多秒的网络往返）
+_result_cache = {}
+_CACHE_TTL = 24 * 60 * 60  # 缓存24小时
+
+# 相似提示词缓存：近似重复的文本（同义改写）也能复用结果
+_similarity_cache = SimilarityCache(max_entries=256, threshold=0.92)
+
+# 磁盘缓存：内存缓存随进程重启丢失，这里把结果落盘，昨天演示过的提示词今天依然秒回
+_DISK_CACHE_DIR = Path(__file__).resolve().parents[2] / "logs" / "llm_cache"
+_DISK_CACHE_TTL = 30 * 86400  # 磁盘缓存保留30天
+
+
+def _disk_cache_path(idea: str) -> Path:
+    key = hashlib.sha256(idea.encode("utf-8")).hexdigest()
+    return _DISK_CACHE_DIR / f"{key}.json"
+
+
+def _disk_cache_get(idea: str):
+    """读取磁盘缓存，不存在或过期返回 None"""
+    path = _disk_cache_path(idea)
+    try:
+        if not path.exists():
+            return None
+        if time.time() - path.stat().st_mtime > _DISK_CACHE_TTL:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"磁盘缓存读取失败: {e}")
+        return None
+
+
+def _disk_cache_put(idea: str, result: dict):
+    try:
+        _DISK_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(_disk_cache_path(idea), "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"磁盘缓存写入失败: {e}")
+
+
+def _extract_preview_url(preview_image: str) -> str:
+    """从 preview_image 字段提取图片URL，兼容 Markdown 图片语法和纯路径"""
+    if not preview_image:
+        return ""
+
+    # Markdown 形式: ![alt](url)
+    start = preview_image.find("](")
+    if start != -1:
+        end = preview_image.find(")", start + 2)
+        if end != -1:
+            return preview_image[start + 2:end]
+
+    # 纯URL/路径直接返回
+    return preview_image
+
+
+def _cached_generate(idea: str) -> dict:
+    """按创意文本缓存 generate 结果，命中时瞬间返回"""
+    now = time.time()
+    hit = _result_cache.get(idea)
+    if hit and now - hit[0] < _CACHE_TTL:
+        print(f"缓存命中: {idea}")
+        return hit[1]
+
+    # 精确缓存未命中，再查相似缓存（同义改写同样省一次模型调用）
+    similar = _similarity_cache.get(idea)
+    if similar is not None:
+        print(f"相似缓存命中: {idea}")
+        return similar
+
+    # 再查磁盘缓存（跨进程重启仍然有效），命中后回填内存缓存
+    disk_hit = _disk_cache_get(idea)
+    if disk_hit is not None:
+        print(f"磁盘缓存命中: {idea}")
+        _result_cache[idea] = (now, disk_hit)
+        _similarity_cache.put(idea, disk_hit)
+        return disk_hit
+
+    result = get_agent().generate(idea)
+    _store_result(idea, result)
+    return result
+
+
+def _store_result(idea: str, result) -> None:
+    """将一次成功的生成结果写入两级缓存"""
+    # 失败结果不进缓存，避免把错误固化24小时
+    if isinstance(result, dict) and "error" not in result:
+        # 入缓存前一次性解析好预览图URL，前端每次拿到的都是现成字段
+        result["preview_url"] = _extract_preview_url(result.get("preview_image", ""))
+        _result_cache[idea] = (time.time(), result)
+        _similarity_cache.put(idea, result)
+        _disk_cache_put(idea, result)
 
 
 @app.route('/')
@@ -75,10 +219,89 @@ def create_project():
 
     print(f"收到UI测试请求: {idea} (将返回固定数据)")
 
-    result = agent.generate(idea)
+    result = _cached_generate(idea)
 
     return jsonify(result)
 
 
+# 后台执行器：生成任务丢进线程池，HTTP请求立刻返回，前端轮询取结果
+_executor = ThreadPoolExecutor(max_workers=4)
+_jobs = {}  # job_id -> (Future, 提交时间)
+_jobs_lock = threading.Lock()
+# 已完成但一直没人来轮询的任务（客户端中途关页）超过这个时限就丢弃
+_JOB_TTL = 300  # 秒
+
+
+def _sweep_stale_jobs():
+    """清理已完成且超时无人认领的任务记录，调用方需持有 _jobs_lock"""
+    now = time.monotonic()
+    stale = [job_id for job_id, (future, ts) in _jobs.items()
+             if future.done() and now - ts > _JOB_TTL]
+    for job_id in stale:
+        _jobs.pop(job_id, None)
+
+
+@app.route('/api/create_async', methods=['POST'])
+def create_project_async():
+    """异步触发生成任务，立即返回 job_id 供轮询"""
+    data = request.json
+    idea = data.get('idea', 'Default Idea')
+
+    print(f"收到UI异步请求: {idea}")
+
+    job_id = uuid.uuid4().hex
+    future = _executor.submit(_cached_generate, idea)
+    with _jobs_lock:
+        _sweep_stale_jobs()
+        _jobs[job_id] = (future, time.monotonic())
+
+    return jsonify({"status": "pending", "job_id": job_id})
+
+
+@app.route('/api/create_status/<job_id>')
+def create_project_status(job_id):
+    """轮询异步任务状态，完成后返回结果并清理任务记录"""
+    with _jobs_lock:
+        entry = _jobs.get(job_id)
+    future = entry[0] if entry else None
+
+    if future is None:
+        return jsonify({"error": "Unknown job id"}), 404
+
+    if not future.done():
+        return jsonify({"status": "pending"})
+
+    with _jobs_lock:
+        _jobs.pop(job_id, None)
+
+    try:
+        result = future.result()
+    except Exception as e:
+        return jsonify({"status": "error", "error": str(e)}), 500
+
+    return jsonify({"status": "done", "result": result})
+
+
+@app.route('/api/create_stream', methods=['POST'])
+def create_project_stream():
+    """SSE流式接口：按 vision -> solution -> image 三个阶段逐段推送结果"""
+    data = request.json
+    idea = data.get('idea', 'Default Idea')
+
+    print(f"收到UI流式请求: {idea}")
+
+    def event_stream():
+        merged = {}
+        for event in get_agent().generate_streaming(idea):
+            merged.update(event["data"])
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+        # 流结束后只缓存聚合完成的完整结果
+        _store_result(idea, merged)
+        yield f"data: {json.dumps({'stage': 'done', 'data': merged}, ensure_ascii=False)}\n\n"
+
+    return Response(event_stream(), mimetype="text/event-stream")
+
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+相似提示词缓存 - 对近似重复的创意文本复用已有结果
+展台/演示场景下用户输入往往围绕几个主题打转（"智能避障小车" vs
+"自动躲开障碍的小车"），完全相同的文本才命中的精确缓存帮不上忙。
+这里用标准库 difflib 的序列相似度做一层近似去重，命中即省一次模型调用。
+"""
+import difflib
+import threading
+from collections import OrderedDict
+
+
+class SimilarityCache:
+    def __init__(self, max_entries=256, threshold=0.92):
+        """
+        初始化相似度缓存
+
+        Args:
+            max_entries: 最大缓存条目数，超出后按LRU淘汰
+            threshold: 相似度阈值（0~1），达到阈值才算命中
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()  # 规范化文本 -> 结果
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        """去掉空白并转小写，降低无意义差异的干扰"""
+        return "".join(text.split()).lower()
+
+    def get(self, prompt: str):
+        """查找与 prompt 足够相似的缓存结果，未命中返回 None"""
+        key = self._normalize(prompt)
+        if not key:
+            return None
+
+        with self._lock:
+            # 精确命中最快，直接返回
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            # 相似度扫描，取最高分
+            best_key = None
+            best_score = 0.0
+            for cached_key in self._entries:
+                score = difflib.SequenceMatcher(None, key, cached_key).ratio()
+                if score > best_score:
+                    best_score = score
+                    best_key = cached_key
+
+            if best_key is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_key)
+                return self._entries[best_key]
+
+        return None
+
+    def put(self, prompt: str, result):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        key = self._normalize(prompt)
+        if not key:
+            return
+
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
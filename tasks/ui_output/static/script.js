@@ -167,6 +167,12 @@ document.addEventListener('DOMContentLoaded', () => {
             setState(UI_STATES.LOADING);
             startSystemLogs();
             startResultPolling('processing');
+        } else if (event.state === 'partial' && event.data) {
+            // 方案先到、预览图还在后台生成：先展示文字结果（封面用占位图），
+            // complete事件到达后会带着真图重建页面
+            console.log('方案已生成，预览图生成中...');
+            buildSlides(event.data);
+            setState(UI_STATES.RESULT);
         } else if (event.state === 'complete' && event.data) {
             // AI处理完成，显示结果
             console.log('AI处理完成，构建结果页面');
@@ -12,7 +12,7 @@ import webbrowser
 import urllib.request
 import yaml
 from datetime import datetime
-from queue import Queue
+from queue import SimpleQueue, Empty
 from flask import Flask, render_template, Response, jsonify, request, send_file
 import cv2
 from io import BytesIO
@@ -38,14 +38,23 @@ class WebManager:
                         template_folder=templates_folder,
                         static_folder=static_folder)
         
-        # Event system for SSE
-        self.event_queue = Queue()
+        # Event system for SSE：每个客户端一个订阅队列，事件广播到所有客户端
+        # （单一共享队列时每条事件只会被一个客户端取走，其余客户端丢事件）
+        self.subscribers = set()
+        self._sub_lock = threading.Lock()
+        # 当前连接的MJPEG观众数（/video_feed生成器进出时增减）
+        self.active_viewers = 0
         self.latest_status = {
             "state": "ready",
             "message": "System Ready",
             "data": None
         }
-        
+        # /api/result 序列化缓存：(结果对象, 序列化文本)，同一结果只 dumps 一次
+        self._result_cache = (None, None)
+        # 去重窗口：流水线连发的同内容processing事件只广播第一条
+        self._last_push_key = None
+        self._last_push_ts = 0.0
+
         # External references (to be set by main app)
         self.camera_manager = None
         self.ai_manager = None
@@ -54,9 +63,37 @@ class WebManager:
         
         # 加载显示配置
         self.display_config = self._load_display_config(config_dir)
-        
+
+        # MJPEG共享编码缓存：同一帧只编码一次，多客户端复用同一份字节
+        self._mjpeg_lock = threading.Lock()
+        self._mjpeg_frame_id = None
+        self._mjpeg_bytes = None
+
         # Setup routes
         self._setup_routes()
+
+    def _encode_preview_frame(self, frame, seq):
+        """预览流编码：同一帧只做一次镜像+缩放+JPEG编码，结果全客户端共享
+
+        预览限宽640、质量70——流带宽和编码CPU都减半以上，快照精度不受影响
+        """
+        with self._mjpeg_lock:
+            if seq == self._mjpeg_frame_id:
+                return self._mjpeg_bytes
+
+            # 无需拷贝：发布后的帧不会再被主循环改写，镜像/缩放各自产生新数组，
+            # 编码只读原帧——省掉每帧一次整帧memcpy
+            out = self._apply_mirror(frame)
+            h, w = out.shape[:2]
+            if w > 640:
+                out = cv2.resize(out, (640, int(h * 640 / w)), interpolation=cv2.INTER_AREA)
+
+            ok, buffer = cv2.imencode('.jpg', out, [cv2.IMWRITE_JPEG_QUALITY, 70])
+            if not ok:
+                return None
+            self._mjpeg_frame_id = seq
+            self._mjpeg_bytes = buffer.tobytes()
+            return self._mjpeg_bytes
     
     def _load_display_config(self, config_dir):
         """加载显示配置"""
@@ -115,6 +152,18 @@ class WebManager:
     
     def push_event(self, state, message, data=None):
         """推送事件到Web客户端"""
+        # 短窗口内内容完全相同的事件只发第一条（流水线偶尔连发同样的
+        # processing状态）；带data的事件不去重，避免吞掉结果更新
+        now = time.monotonic()
+        if data is None:
+            key = (state, message)
+            if key == self._last_push_key and now - self._last_push_ts < 0.05:
+                return
+            self._last_push_key = key
+        else:
+            self._last_push_key = None
+        self._last_push_ts = now
+
         event_data = {
             "state": state,
             "message": message,
@@ -123,9 +172,15 @@ class WebManager:
         }
         print(f"[WebManager] 推送事件: state={state}, message={message[:50] if message else None}...")
         self.latest_status = event_data
-        self.event_queue.put(event_data)
-        print(f"[WebManager] 事件已放入队列，队列大小: {self.event_queue.qsize()}")
-    
+        # 发布时只序列化一次，订阅队列里放的是成帧的SSE文本，
+        # 避免每个客户端各自重复 json.dumps（结果里可能带很长的图片URL）
+        payload = f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
+        with self._sub_lock:
+            targets = list(self.subscribers)
+        for q in targets:
+            q.put_nowait(payload)
+        print(f"[WebManager] 事件已广播到 {len(targets)} 个客户端: state={state}")
+
     def _setup_routes(self):
         """设置Flask路由"""
         
@@ -152,9 +207,15 @@ class WebManager:
         @self.app.route('/api/result')
         def api_result():
             """返回最新完整结果"""
-            if self.ai_manager and self.ai_manager.last_complete_result:
-                return jsonify(self.ai_manager.last_complete_result)
-            return jsonify({"error": "No results available"})
+            result = self.ai_manager.last_complete_result if self.ai_manager else None
+            if not result:
+                return jsonify({"error": "No results available"})
+            # 同一个结果对象只序列化一次，前端轮询时直接复用缓存文本
+            cached_obj, cached_body = self._result_cache
+            if cached_obj is not result:
+                cached_body = json.dumps(result, ensure_ascii=False)
+                self._result_cache = (result, cached_body)
+            return Response(cached_body, mimetype='application/json')
         
         @self.app.route('/api/display_config')
         def api_display_config():
@@ -241,9 +302,7 @@ class WebManager:
             print("="*50)
             
             def shutdown():
-                """延        # 应用镜像效果
-                            frame_copy = self._apply_mirror(frame_copy)
-                    迟关闭服务器和程序"""
+                """延迟关闭服务器和程序"""
                 time.sleep(1)  # 等待响应发送完成
                 
                 # 停止主循环
@@ -283,49 +342,68 @@ class WebManager:
             """MJPEG视频流"""
             def generate():
                 boundary = "frame"
-                while True:
-                    frame_copy = None
-                    if self.camera_manager:
-                        frame_copy = self.camera_manager.get_latest_processed_frame()
-                        if frame_copy is not None:
-                            frame_copy = frame_copy.copy()
-                            # 应用镜像效果
-                            frame_copy = self._apply_mirror(frame_copy)
-                    
-                    if frame_copy is not None:
-                        ok, buffer = cv2.imencode('.jpg', frame_copy)
-                        if ok:
-                            jpg_bytes = buffer.tobytes()
+                last_seq = 0
+                # 在线观众计数：主循环据此决定是否全速跑检测
+                with self._sub_lock:
+                    self.active_viewers += 1
+                try:
+                    while True:
+                        if not self.camera_manager:
+                            time.sleep(0.05)
+                            continue
+
+                        # 条件变量等新帧：有帧立即醒，没帧挂起不耗CPU
+                        frame, seq = self.camera_manager.wait_for_new_frame(last_seq)
+                        if frame is None:
+                            continue
+                        last_seq = seq
+
+                        # 同一帧编码一次，所有客户端共享同一份JPEG字节
+                        jpg_bytes = self._encode_preview_frame(frame, seq)
+                        if jpg_bytes is not None:
                             yield (b"--" + boundary.encode() + b"\r\n"
                                    b"Content-Type: image/jpeg\r\n"
                                    b"Content-Length: " + str(len(jpg_bytes)).encode() + b"\r\n\r\n" + jpg_bytes + b"\r\n")
-                    else:
-                        time.sleep(0.05)
+                finally:
+                    with self._sub_lock:
+                        self.active_viewers -= 1
             
             return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
         
         @self.app.route('/stream')
         def stream():
-            """服务器发送事件端点"""
+            """服务器发送事件端点（每个客户端独立订阅队列，事件广播不丢失）"""
             def event_stream():
-                while True:
-                    try:
-                        # 首先获取一个事件（阻塞式等待）
-                        event = self.event_queue.get(timeout=30)
-                        yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
-                        
-                        # 然后立即处理队列中所有剩余事件（非阻塞）
-                        while not self.event_queue.empty():
-                            try:
-                                next_event = self.event_queue.get_nowait()
-                                yield f"data: {json.dumps(next_event, ensure_ascii=False)}\n\n"
-                            except:
-                                break
-                                
-                    except:
-                        # 超时后发送keepalive
-                        yield f"data: {{\"type\": \"keepalive\"}}\n\n"
-            
+                q = SimpleQueue()
+                with self._sub_lock:
+                    self.subscribers.add(q)
+                try:
+                    while True:
+                        try:
+                            # 首先获取一个事件（阻塞式等待）；队列里已是
+                            # push_event 序列化好的SSE文本，这里不再 dumps
+                            # 超时取短一些：断开的客户端最多占用线程5秒
+                            # （生成器只有在yield写出失败时才能感知断开）
+                            payload = [q.get(timeout=5)]
+
+                            # 再把队列中积压的事件一并取出，合并为一次socket写出
+                            while not q.empty():
+                                try:
+                                    payload.append(q.get_nowait())
+                                except:
+                                    break
+
+                            yield "".join(payload)
+
+                        except Empty:
+                            # SSE注释行作为keepalive：EventSource直接忽略，
+                            # 前端不用专门过滤keepalive事件
+                            yield ": ping\n\n"
+                finally:
+                    # 客户端断开时移除订阅
+                    with self._sub_lock:
+                        self.subscribers.discard(q)
+
             return Response(event_stream(), mimetype="text/event-stream")
     
         @self.app.route('/api/proxy_image')